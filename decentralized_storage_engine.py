@@ -1,305 +1,590 @@
-import hashlib
-from typing import Dict, List, Tuple, Optional
-from cryptography.fernet import Fernet
-import zfec
-
-
-class DecentralizedStorageEngine:
-    """
-    Secure storage engine implementing encryption, sharding, and integrity verification.
-    """
-    
-    def __init__(self, encryption_key: Optional[bytes] = None):
-        """
-        Initialize the storage engine with an encryption key.
-        
-        Args:
-            encryption_key: Fernet encryption key. If None, generates a new key.
-        
-        Security Note: In production, store this key securely (HSM, key vault, etc.)
-        """
-        if encryption_key is None:
-            self.encryption_key = Fernet.generate_key()
-            print(f"[SECURITY] New encryption key generated: {self.encryption_key.decode()}")
-        else:
-            self.encryption_key = encryption_key
-        
-        self.cipher = Fernet(self.encryption_key)
-        
-        # Erasure coding parameters: k=3 shards required, m=5 total shards
-        self.k_required = 3  # Minimum shards needed for reconstruction
-        self.m_total = 5     # Total shards created
-    
-    
-    def _calculate_hash(self, data: bytes) -> str:
-        """
-        Calculate SHA-256 hash for integrity verification.
-        
-        Args:
-            data: Byte string to hash
-            
-        Returns:
-            Hexadecimal string representation of the hash
-            
-        Security Note: SHA-256 provides cryptographic integrity verification
-        """
-        return hashlib.sha256(data).hexdigest()
-    
-    
-    def encrypt_and_shard(self, plaintext: bytes) -> Tuple[List[bytes], Dict[int, str]]:
-        """
-        Encrypt data and split into redundant shards with integrity metadata.
-        
-        Security Flow:
-        1. Encrypt plaintext using Fernet (AES-128 in CBC mode with HMAC)
-        2. Shard encrypted data using erasure coding (zfec)
-        3. Generate SHA-256 hash for each shard (integrity verification)
-        4. Store hashes in metadata for later verification
-        
-        Args:
-            plaintext: Original data to protect
-            
-        Returns:
-            Tuple of (shard_list, metadata_dict)
-            - shard_list: List of 5 encrypted shards
-            - metadata_dict: Dictionary mapping shard_id -> SHA-256 hash
-            
-        Security Properties:
-        - Confidentiality: Fernet encryption protects data at rest
-        - Availability: Any 3 of 5 shards can reconstruct data
-        - Integrity: SHA-256 hashes detect tampering
-        """
-        print(f"\n[ENCRYPT] Encrypting {len(plaintext)} bytes of plaintext...")
-        
-        # Step 1: Client-side encryption
-        # Fernet provides authenticated encryption (AES-128 + HMAC-SHA256)
-        encrypted_data = self.cipher.encrypt(plaintext)
-        print(f"[ENCRYPT] Encrypted data size: {len(encrypted_data)} bytes")
-        
-        # Step 2: Data sharding with erasure coding
-        # Create encoder: k=3 required shards, m=5 total shards
-        encoder = zfec.Encoder(self.k_required, self.m_total)
-        
-        # zfec requires input size to be divisible by k
-        # Pad if necessary
-        padding_length = (self.k_required - (len(encrypted_data) % self.k_required)) % self.k_required
-        padded_data = encrypted_data + b'\x00' * padding_length
-        
-        # Split into k equal chunks for encoding
-        chunk_size = len(padded_data) // self.k_required
-        chunks = [padded_data[i:i+chunk_size] for i in range(0, len(padded_data), chunk_size)]
-        
-        # Encode chunks into m shards
-        shards = encoder.encode(chunks)
-        print(f"[SHARD] Created {len(shards)} shards, each {len(shards[0])} bytes")
-        print(f"[SHARD] Redundancy: Any {self.k_required} of {self.m_total} shards can reconstruct data")
-        
-        # Step 3: Integrity verification - calculate SHA-256 for each shard
-        metadata = {}
-        for shard_id, shard in enumerate(shards):
-            shard_hash = self._calculate_hash(shard)
-            metadata[shard_id] = shard_hash
-            print(f"[INTEGRITY] Shard {shard_id} hash: {shard_hash[:16]}...")
-        
-        return list(shards), metadata
-    
-    
-    def recover_and_decrypt(self, 
-                           shards: List[bytes], 
-                           shard_ids: List[int],
-                           metadata: Dict[int, str]) -> bytes:
-        """
-        Verify shard integrity, reconstruct encrypted data, and decrypt.
-        
-        Security Flow:
-        1. MANDATORY integrity verification using SHA-256 hash
-        2. Detect tampering - abort if hash mismatch found
-        3. Reconstruct encrypted data using erasure decoding
-        4. Decrypt using Fernet to recover plaintext
-        
-        Args:
-            shards: List of available shards (at least k_required)
-            shard_ids: Corresponding shard IDs
-            metadata: Dictionary with expected SHA-256 hashes
-            
-        Returns:
-            Original plaintext bytes
-            
-        Raises:
-            ValueError: If integrity verification fails (tampering detected)
-            ValueError: If insufficient shards provided
-            
-        Security Properties:
-        - Tamper Detection: MANDATORY SHA-256 verification before reconstruction
-        - Fail-Safe: Abort on any integrity violation
-        - Confidentiality: Decryption only after integrity verified
-        
-        Note: Integrity verification is ALWAYS enforced and cannot be bypassed.
-        """
-        print(f"\n[RECOVER] Attempting recovery with {len(shards)} shards (IDs: {shard_ids})")
-        
-        # Step 1: Verify minimum shard requirement
-        if len(shards) < self.k_required:
-            raise ValueError(
-                f"[SECURITY ERROR] Insufficient shards: {len(shards)} provided, "
-                f"{self.k_required} required for reconstruction"
-            )
-        
-        # Step 2: MANDATORY Integrity verification - detect tampering
-        print("[INTEGRITY] Verifying shard integrity (MANDATORY)...")
-        for shard_id, shard in zip(shard_ids, shards):
-            expected_hash = metadata.get(shard_id)
-            if expected_hash is None:
-                raise ValueError(
-                    f"[SECURITY ERROR] No metadata found for shard {shard_id}. "
-                    f"Possible data corruption or missing metadata."
-                )
-            
-            actual_hash = self._calculate_hash(shard)
-            
-            if actual_hash != expected_hash:
-                # CRITICAL: Tampering detected
-                print(f"[SECURITY ALERT] Shard {shard_id} INTEGRITY VIOLATION!")
-                print(f"  Expected: {expected_hash}")
-                print(f"  Actual:   {actual_hash}")
-                raise ValueError(
-                    f"[SECURITY ERROR] Shard {shard_id} integrity check FAILED. "
-                    f"Tampering detected! Aborting reconstruction for security."
-                )
-            
-            print(f"[INTEGRITY] Shard {shard_id} verified: {actual_hash[:16]}... ✓")
-        
-        # Step 3: Reconstruct encrypted data using erasure decoding
-        print("[RECONSTRUCT] All shards verified. Reconstructing data...")
-        decoder = zfec.Decoder(self.k_required, self.m_total)
-        
-        # Use only k_required shards for reconstruction
-        selected_shards = shards[:self.k_required]
-        selected_ids = shard_ids[:self.k_required]
-        
-        # Decode shards back to original chunks
-        reconstructed_chunks = decoder.decode(selected_shards, selected_ids)
-        
-        # Combine chunks to get padded encrypted data
-        reconstructed_data = b''.join(reconstructed_chunks)
-        
-        # Step 4: Decrypt using Fernet
-        try:
-            plaintext = self.cipher.decrypt(reconstructed_data.rstrip(b'\x00'))
-            print(f"[DECRYPT] Successfully decrypted {len(plaintext)} bytes")
-            return plaintext
-        except Exception as e:
-            raise ValueError(f"[SECURITY ERROR] Decryption failed: {str(e)}")
-
-
-def demonstrate_secure_storage():
-    """
-    Demonstration of the decentralized storage engine with security features.
-    """
-    print("="*70)
-    print("DECENTRALIZED STORAGE ENGINE - SECURITY DEMONSTRATION")
-    print("="*70)
-    
-    # Initialize storage engine
-    engine = DecentralizedStorageEngine()
-    
-    # Original sensitive data
-    original_data = b"CONFIDENTIAL: User financial records and PII data that must be protected"
-    print(f"\n[ORIGINAL] Data: {original_data.decode()}")
-    print(f"[ORIGINAL] Size: {len(original_data)} bytes")
-    
-    # ========================================================================
-    # SCENARIO 1: Normal Operation - Encrypt, Shard, Store, Recover
-    # ========================================================================
-    print("\n" + "="*70)
-    print("SCENARIO 1: Normal Secure Storage & Recovery")
-    print("="*70)
-    
-    # Encrypt and shard the data
-    shards, metadata = engine.encrypt_and_shard(original_data)
-    
-    print(f"\n[STORAGE] Data distributed across {len(shards)} storage nodes")
-    print(f"[STORAGE] Each node holds one encrypted shard")
-    
-    # Simulate distributed storage: only 3 out of 5 shards available
-    available_shards = [shards[0], shards[2], shards[4]]
-    available_ids = [0, 2, 4]
-    
-    print(f"\n[SCENARIO] Simulating retrieval: Nodes 0, 2, 4 available")
-    print(f"[SCENARIO] Nodes 1, 3 offline/unavailable")
-    
-    # Recover and decrypt
-    recovered_data = engine.recover_and_decrypt(
-        available_shards, 
-        available_ids, 
-        metadata
-    )
-    
-    # Verify correctness
-    assert recovered_data == original_data, "Data integrity compromised!"
-    print(f"\n[SUCCESS] ✓ Data recovered successfully: {recovered_data.decode()}")
-    
-    # ========================================================================
-    # SCENARIO 2: Security Test - Tampered Shard Detection
-    # ========================================================================
-    print("\n" + "="*70)
-    print("SCENARIO 2: Tamper Detection - Modified Shard")
-    print("="*70)
-    
-    # Simulate attacker tampering with a shard
-    tampered_shards = available_shards.copy()
-    tampered_shards[1] = b"TAMPERED_DATA" + tampered_shards[1][13:]  # Modify shard
-    
-    print(f"\n[ATTACK] Simulating attacker modifying shard 2...")
-    print(f"[ATTACK] Original shard hash: {metadata[2][:16]}...")
-    
-    try:
-        # Attempt recovery with tampered shard
-        engine.recover_and_decrypt(
-            tampered_shards,
-            available_ids,
-            metadata
-        )
-        print("[FAILURE] ✗ Tampering NOT detected - SECURITY BREACH!")
-    except ValueError as e:
-        print(f"\n[SUCCESS] ✓ Tampering detected and blocked!")
-        print(f"[SUCCESS] ✓ Error: {str(e)}")
-    
-    # ========================================================================
-    # SCENARIO 3: Insufficient Shards
-    # ========================================================================
-    print("\n" + "="*70)
-    print("SCENARIO 3: Availability Test - Insufficient Shards")
-    print("="*70)
-    
-    insufficient_shards = [shards[0], shards[1]]  # Only 2 shards
-    insufficient_ids = [0, 1]
-    
-    print(f"\n[SCENARIO] Only 2 shards available (need {engine.k_required})")
-    
-    try:
-        engine.recover_and_decrypt(
-            insufficient_shards,
-            insufficient_ids,
-            metadata
-        )
-        print("[FAILURE] ✗ Should not succeed with insufficient shards!")
-    except ValueError as e:
-        print(f"\n[SUCCESS] ✓ Correctly rejected insufficient shards")
-        print(f"[SUCCESS] ✓ Error: {str(e)}")
-    
-    print("\n" + "="*70)
-    print("SECURITY DEMONSTRATION COMPLETE")
-    print("="*70)
-    print("\n[SUMMARY] Security Properties Verified:")
-    print("  ✓ Confidentiality: Data encrypted before sharding")
-    print("  ✓ Availability: Any 3 of 5 shards can recover data")
-    print("  ✓ Integrity: SHA-256 detects tampering")
-    print("  ✓ Fail-Safe: Tampered shards rejected before decryption")
-
-
-if __name__ == "__main__":
-    # Install required packages:
-    # pip install cryptography zfec
-    
-    demonstrate_secure_storage()
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, List, Tuple, Optional
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+import zfec
+
+try:
+    # BLAKE3 (Rust, runtime SIMD dispatch) hashes several GB/s per core -
+    # well beyond even hardware-accelerated SHA-256 on MB-sized shards
+    import blake3
+except ImportError:
+    blake3 = None
+
+
+logger = logging.getLogger(__name__)
+
+# Below this shard size the thread-pool dispatch overhead exceeds the
+# hashing work itself (hashlib only releases the GIL above ~2 KiB and
+# parallelism only pays off well beyond that), so hash inline instead
+_PARALLEL_HASH_MIN_BYTES = 64 * 1024
+
+
+def _new_sha256(data: bytes = b""):
+    """
+    Create a SHA-256 hash object using the fastest available backend.
+
+    On Python 3.9+ with OpenSSL 3, passing usedforsecurity=False lets
+    OpenSSL select its accelerated provider (SHA-NI / AVX2 dispatch),
+    which is significantly faster than the generic path on modern CPUs.
+    Falls back to plain hashlib.sha256 on older builds.
+    """
+    try:
+        return hashlib.new("sha256", data, usedforsecurity=False)
+    except (TypeError, ValueError):
+        return hashlib.sha256(data)
+
+
+class _AeadCipher:
+    """
+    Single-pass AEAD cipher with a Fernet-compatible key format.
+
+    Accepts the same urlsafe-base64 32-byte keys that Fernet.generate_key()
+    produces, so existing key handling (metadata manifests, environment
+    variables) keeps working. Unlike Fernet (AES-128-CBC + HMAC-SHA256 +
+    base64), both supported AEADs authenticate and encrypt in one
+    hardware-accelerated pass and the token stays binary:
+
+    - "aes-gcm" (default): AES-256-GCM via AES-NI + PCLMULQDQ
+    - "chacha20-poly1305": vectorised ChaCha20, the faster choice on
+      CPUs without AES instructions
+
+    Both use a 12-byte nonce and a 16-byte tag, with token layout:
+
+        length(8 bytes, big-endian) || nonce(12 bytes) || ciphertext+tag
+
+    The explicit length makes the token safe to zero-pad for erasure
+    coding: trailing pad bytes are ignored on decrypt.
+    """
+
+    def __init__(self, key: bytes, algorithm: str = "aes-gcm"):
+        raw_key = base64.urlsafe_b64decode(key)
+        if algorithm == "chacha20-poly1305":
+            self._aead = ChaCha20Poly1305(raw_key)
+        elif algorithm == "aes-gcm":
+            self._aead = AESGCM(raw_key)
+        else:
+            raise ValueError(f"Unsupported AEAD algorithm: {algorithm}")
+
+    def encrypt(self, plaintext: bytes) -> bytes:
+        nonce = os.urandom(12)
+        body = nonce + self._aead.encrypt(nonce, plaintext, None)
+        return struct.pack(">Q", len(body)) + body
+
+    def decrypt(self, token: bytes) -> bytes:
+        (body_length,) = struct.unpack_from(">Q", token)
+        body = token[8:8 + body_length]
+        return self._aead.decrypt(bytes(body[:12]), bytes(body[12:]), None)
+
+
+@lru_cache(maxsize=1)
+def _shared_hash_pool() -> ThreadPoolExecutor:
+    """
+    Process-wide thread pool for shard hashing.
+
+    hashlib releases the GIL inside update(), so the workers run SHA-NI /
+    BLAKE3 code truly in parallel. One shared pool means the per-download
+    engines the orchestrator creates stop paying thread startup costs
+    (and stop accumulating idle threads) on every transaction.
+    """
+    return ThreadPoolExecutor(
+        max_workers=min(32, os.cpu_count() or 1),
+        thread_name_prefix="shard-hash",
+    )
+
+
+@lru_cache(maxsize=32)
+def _erasure_coders(k: int, m: int) -> Tuple["zfec.Encoder", "zfec.Decoder"]:
+    """
+    Build (or reuse) the zfec encoder/decoder pair for a (k, m) scheme.
+
+    zfec's C core precomputes GF(2^8) multiplication tables per coder;
+    caching by (k, m) means the orchestrator's per-download engines share
+    one pair instead of rebuilding the tables every time. This is also
+    the single seam where an alternative erasure backend (e.g. an
+    AVX2/GFNI-vectorised Reed-Solomon) would be slotted in.
+    """
+    return zfec.Encoder(k, m), zfec.Decoder(k, m)
+
+
+@lru_cache(maxsize=8)
+def _cipher_for(key: bytes, use_fernet: bool, aead: str):
+    """
+    Build (or reuse) a cipher for a key.
+
+    The orchestrator constructs one engine per file on download; key
+    setup (base64 decode, key schedule, Fernet's subcipher split) is
+    identical work for a repeated key, so cache the cipher object. Both
+    cipher types are stateless per call and safe to share.
+
+    The cache holds decoded key material, so it is kept as small as the
+    orchestrator's engine LRU (8 entries): keys for files beyond the hot
+    set are evicted here too rather than lingering in memory.
+    """
+    if use_fernet:
+        return Fernet(key)
+    return _AeadCipher(key, aead)
+
+
+class DecentralizedStorageEngine:
+    """
+    Secure storage engine implementing encryption, sharding, and integrity verification.
+    """
+    
+    def __init__(self,
+                 encryption_key: Optional[bytes] = None,
+                 use_fernet: bool = False,
+                 aead: str = "aes-gcm"):
+        """
+        Initialize the storage engine with an encryption key.
+
+        Args:
+            encryption_key: Urlsafe-base64 32-byte key (Fernet key format).
+                            If None, generates a new key.
+            use_fernet: Use the legacy Fernet cipher instead of an AEAD.
+                        Only needed to read data encrypted by older versions.
+            aead: AEAD algorithm, "aes-gcm" (default) or
+                  "chacha20-poly1305" for CPUs without AES instructions;
+                  "fernet" is accepted as an alias for use_fernet=True so
+                  the cipher mode round-trips through manifests.
+
+        Security Note: In production, store this key securely (HSM, key vault, etc.)
+        """
+        if encryption_key is None:
+            self.encryption_key = Fernet.generate_key()
+            print(f"[SECURITY] New encryption key generated: {self.encryption_key.decode()}")
+        else:
+            self.encryption_key = encryption_key
+
+        if aead == "fernet":
+            use_fernet = True
+        self.use_fernet = use_fernet
+        # self.aead is what manifests record; reporting "fernet" here
+        # means a download rebuilds the engine in the same cipher mode
+        self.aead = "fernet" if use_fernet else aead
+        self.cipher = _cipher_for(bytes(self.encryption_key), use_fernet, aead)
+        
+        # Erasure coding parameters: k=3 shards required, m=5 total shards
+        self.k_required = 3  # Minimum shards needed for reconstruction
+        self.m_total = 5     # Total shards created
+
+        # k and m are fixed for the lifetime of the engine; the cached
+        # module-level pair means even short-lived engines (one per
+        # download) skip rebuilding zfec's Galois-field tables
+        self._encoder, self._decoder = _erasure_coders(self.k_required, self.m_total)
+
+        # hashlib releases the GIL for buffers >2 KiB, so hashing the m
+        # independent shards on a thread pool scales nearly linearly;
+        # the pool is process-wide (see _shared_hash_pool)
+        self._hash_pool = _shared_hash_pool()
+
+        # Preferred integrity hash; recorded in metadata so recovery can
+        # verify files written before/after the BLAKE3 switch
+        self.hash_algorithm = "blake3" if blake3 is not None else "sha256"
+
+
+    def _hash_shards(self, shards: List[bytes], algorithm: Optional[str] = None) -> List[bytes]:
+        """
+        Hash a batch of shards, in parallel when the shards are large
+        enough for the thread pool to pay off.
+
+        Args:
+            shards: Shard buffers to hash
+            algorithm: Hash algorithm to use (defaults to the engine's)
+
+        Returns:
+            Hashes in the same order as the input shards
+        """
+        hash_one = partial(self._calculate_hash, algorithm=algorithm)
+        if shards and len(shards[0]) >= _PARALLEL_HASH_MIN_BYTES:
+            return list(self._hash_pool.map(hash_one, shards))
+        return [hash_one(shard) for shard in shards]
+    
+    
+    def _calculate_hash(self, data: bytes, algorithm: Optional[str] = None) -> bytes:
+        """
+        Calculate an integrity hash (BLAKE3 when available, else SHA-256).
+
+        Args:
+            data: Byte string to hash
+            algorithm: "blake3" or "sha256"; defaults to the engine's
+                       preferred algorithm. Verification passes the
+                       algorithm recorded in the shard metadata so old
+                       files stay verifiable.
+
+        Returns:
+            Raw 32-byte digest (hex conversion happens only at the JSON
+            manifest boundary)
+
+        Security Note: Both algorithms are collision-resistant and suit
+        integrity verification; BLAKE3 is simply much faster on large shards
+        """
+        algorithm = algorithm or self.hash_algorithm
+        if algorithm == "blake3":
+            if blake3 is None:
+                raise ValueError(
+                    "[SECURITY ERROR] Metadata requires BLAKE3 hashes but the "
+                    "blake3 package is not installed (pip install blake3)"
+                )
+            return blake3.blake3(data).digest()
+        return _new_sha256(data).digest()
+    
+    
+    def encrypt_and_shard(self, plaintext: bytes) -> Tuple[List[bytes], Dict[int, bytes]]:
+        """
+        Encrypt data and split into redundant shards with integrity metadata.
+        
+        Security Flow:
+        1. Encrypt plaintext using a single-pass AEAD (or legacy Fernet)
+        2. Shard encrypted data using erasure coding (zfec)
+        3. Generate SHA-256 hash for each shard (integrity verification)
+        4. Store hashes in metadata for later verification
+        
+        Args:
+            plaintext: Original data to protect (any bytes-like object;
+                mmap/memoryview inputs are encrypted without copying)
+
+        Returns:
+            Tuple of (shard_list, metadata_dict)
+            - shard_list: List of 5 encrypted shards
+            - metadata_dict: Dictionary mapping shard_id -> raw digest,
+              plus "_ct_len" holding the exact pre-padding ciphertext length
+
+        Security Properties:
+        - Confidentiality: Authenticated encryption protects data at rest
+        - Availability: Any 3 of 5 shards can reconstruct data
+        - Integrity: SHA-256 hashes detect tampering
+        """
+        logger.debug("[ENCRYPT] Encrypting %d bytes of plaintext...", len(plaintext))
+
+        # Step 1: Client-side encryption
+        # The AEAD provides authenticated encryption in a single pass
+        # (legacy Fernet: AES-128-CBC + HMAC-SHA256). Any buffer-protocol
+        # object works here - callers pass mmap/memoryview so a file is
+        # never copied into a bytes object just to be encrypted - except
+        # that Fernet insists on bytes and needs a one-off materialisation
+        if self.use_fernet and not isinstance(plaintext, bytes):
+            plaintext = bytes(plaintext)
+        encrypted_data = self.cipher.encrypt(plaintext)
+        logger.debug("[ENCRYPT] Encrypted data size: %d bytes", len(encrypted_data))
+        
+        # Step 2: Data sharding with erasure coding (cached encoder)
+        # zfec requires input size to be divisible by k
+        # Pad if necessary
+        k = self.k_required
+        padding_length = (k - (len(encrypted_data) % k)) % k
+
+        # Pad into a pre-sized bytearray rather than concatenating: the
+        # tail of a fresh bytearray is already zero, so only the head is
+        # written and the extra full-size allocation+memcpy is avoided.
+        # When no padding is needed the ciphertext is used as-is.
+        if padding_length:
+            padded_data = bytearray(len(encrypted_data) + padding_length)
+            padded_data[:len(encrypted_data)] = encrypted_data
+        else:
+            padded_data = encrypted_data
+        
+        # Split into k equal chunks for encoding. memoryview slices avoid
+        # copying every byte of the ciphertext into k new bytes objects;
+        # zfec accepts any buffer-protocol object
+        chunk_size = len(padded_data) // k
+        mv = memoryview(padded_data)
+        chunks = [mv[i * chunk_size:(i + 1) * chunk_size] for i in range(k)]
+
+        # Encode chunks into m shards
+        shards = self._encoder.encode(chunks)
+        logger.debug("[SHARD] Created %d shards, each %d bytes", len(shards), len(shards[0]))
+        logger.debug("[SHARD] Redundancy: Any %d of %d shards can reconstruct data",
+                     self.k_required, self.m_total)
+        
+        # Step 3: Integrity verification - hash all shards in parallel
+        metadata = dict(enumerate(self._hash_shards(shards)))
+        if logger.isEnabledFor(logging.DEBUG):
+            for shard_id, shard_hash in metadata.items():
+                logger.debug("[INTEGRITY] Shard %d hash: %s...", shard_id, shard_hash.hex()[:16])
+
+        # Record the exact pre-padding ciphertext length so recovery can
+        # slice the padding off instead of scanning for trailing zeros,
+        # and the hash algorithm so older files stay verifiable
+        metadata["_ct_len"] = len(encrypted_data)
+        metadata["_hash_alg"] = self.hash_algorithm
+        
+        return list(shards), metadata
+    
+    
+    def recover_and_decrypt(self, 
+                           shards: List[bytes], 
+                           shard_ids: List[int],
+                           metadata: Dict[int, bytes]) -> bytes:
+        """
+        Verify shard integrity, reconstruct encrypted data, and decrypt.
+        
+        Security Flow:
+        1. MANDATORY integrity verification using SHA-256 hash
+        2. Detect tampering - abort if hash mismatch found
+        3. Reconstruct encrypted data using erasure decoding
+        4. Decrypt using the AEAD (or legacy Fernet) to recover plaintext
+        
+        Args:
+            shards: List of available shards (at least k_required)
+            shard_ids: Corresponding shard IDs
+            metadata: Dictionary with expected raw digests (and the
+                      optional "_ct_len" ciphertext length)
+            
+        Returns:
+            Original plaintext bytes
+            
+        Raises:
+            ValueError: If integrity verification fails (tampering detected)
+            ValueError: If insufficient shards provided
+            
+        Security Properties:
+        - Tamper Detection: MANDATORY SHA-256 verification before reconstruction
+        - Fail-Safe: Abort on any integrity violation
+        - Confidentiality: Decryption only after integrity verified
+        
+        Note: Integrity verification is ALWAYS enforced and cannot be bypassed.
+        """
+        logger.debug("[RECOVER] Attempting recovery with %d shards (IDs: %s)", len(shards), shard_ids)
+        
+        # Step 1: Verify minimum shard requirement
+        if len(shards) < self.k_required:
+            raise ValueError(
+                f"[SECURITY ERROR] Insufficient shards: {len(shards)} provided, "
+                f"{self.k_required} required for reconstruction"
+            )
+        
+        # Step 2: MANDATORY Integrity verification - detect tampering
+        # (shards hashed in parallel, comparisons stay sequential)
+        logger.debug("[INTEGRITY] Verifying shard integrity (MANDATORY)...")
+        hash_algorithm = metadata.get("_hash_alg", "sha256")
+        actual_hashes = self._hash_shards(shards, hash_algorithm)
+        for shard_id, actual_hash in zip(shard_ids, actual_hashes):
+            expected_hash = metadata.get(shard_id)
+            if expected_hash is None:
+                raise ValueError(
+                    f"[SECURITY ERROR] No metadata found for shard {shard_id}. "
+                    f"Possible data corruption or missing metadata."
+                )
+
+            # Constant-time comparison of raw digests: no short-circuit
+            # timing leak and no 64-char string compare per shard
+            if not hmac.compare_digest(actual_hash, expected_hash):
+                # CRITICAL: Tampering detected
+                logger.error("[SECURITY ALERT] Shard %d INTEGRITY VIOLATION! expected=%s actual=%s",
+                             shard_id, expected_hash.hex(), actual_hash.hex())
+                raise ValueError(
+                    f"[SECURITY ERROR] Shard {shard_id} integrity check FAILED. "
+                    f"Tampering detected! Aborting reconstruction for security."
+                )
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[INTEGRITY] Shard %d verified: %s... ✓", shard_id, actual_hash.hex()[:16])
+        
+        # Step 3: Reconstruct encrypted data using erasure decoding (cached decoder)
+        logger.debug("[RECONSTRUCT] All shards verified. Reconstructing data...")
+
+        # Use only k_required shards for reconstruction
+        selected_shards = shards[:self.k_required]
+        selected_ids = shard_ids[:self.k_required]
+
+        # Decode shards back to original chunks
+        reconstructed_chunks = self._decoder.decode(selected_shards, selected_ids)
+        
+        # Combine chunks directly into an exact-size buffer. join + slice
+        # would write the padded ciphertext once and then copy all but the
+        # padding a second time; assembling into a pre-sized bytearray
+        # touches each byte exactly once.
+        ct_len = metadata.get("_ct_len")
+        if ct_len is not None:
+            reconstructed_data = bytearray(ct_len)
+            offset = 0
+            for chunk in reconstructed_chunks:
+                take = min(len(chunk), ct_len - offset)
+                reconstructed_data[offset:offset + take] = chunk[:take]
+                offset += take
+        else:
+            reconstructed_data = b''.join(reconstructed_chunks)
+
+        # Step 4: Decrypt
+        try:
+            if self.use_fernet:
+                if ct_len is None:
+                    # Legacy metadata without a length: Fernet tokens are
+                    # base64, so stripping zero padding is safe there
+                    reconstructed_data = reconstructed_data.rstrip(b'\x00')
+                # Fernet insists on bytes (the AEAD takes any buffer), so
+                # materialise the assembled bytearray
+                if not isinstance(reconstructed_data, bytes):
+                    reconstructed_data = bytes(reconstructed_data)
+            plaintext = self.cipher.decrypt(reconstructed_data)
+            logger.debug("[DECRYPT] Successfully decrypted %d bytes", len(plaintext))
+            return plaintext
+        except Exception as e:
+            raise ValueError(f"[SECURITY ERROR] Decryption failed: {str(e)}")
+
+    def recover_and_decrypt_iter(self,
+                                 shards: List[bytes],
+                                 shard_ids: List[int],
+                                 metadata: Dict[int, bytes],
+                                 chunk_size: int = 1 << 20):
+        """
+        Like recover_and_decrypt, but yield the plaintext in chunks.
+
+        The AEAD (and Fernet) verify their authentication tag over the
+        whole message, so decryption itself is necessarily one-shot; what
+        this saves is everything downstream. Callers can hash and write
+        each chunk as it is yielded instead of holding a second full-size
+        copy of the file, and the yielded memoryview slices never copy.
+
+        Yields:
+            memoryview slices of the plaintext, chunk_size bytes each
+            (the final slice may be shorter)
+
+        Raises:
+            ValueError: Same conditions as recover_and_decrypt
+        """
+        plaintext = self.recover_and_decrypt(shards, shard_ids, metadata)
+        view = memoryview(plaintext)
+        for offset in range(0, len(plaintext), chunk_size):
+            yield view[offset:offset + chunk_size]
+
+
+def demonstrate_secure_storage():
+    """
+    Demonstration of the decentralized storage engine with security features.
+    """
+    print("="*70)
+    print("DECENTRALIZED STORAGE ENGINE - SECURITY DEMONSTRATION")
+    print("="*70)
+    
+    # Initialize storage engine
+    engine = DecentralizedStorageEngine()
+    
+    # Original sensitive data
+    original_data = b"CONFIDENTIAL: User financial records and PII data that must be protected"
+    print(f"\n[ORIGINAL] Data: {original_data.decode()}")
+    print(f"[ORIGINAL] Size: {len(original_data)} bytes")
+    
+    # ========================================================================
+    # SCENARIO 1: Normal Operation - Encrypt, Shard, Store, Recover
+    # ========================================================================
+    print("\n" + "="*70)
+    print("SCENARIO 1: Normal Secure Storage & Recovery")
+    print("="*70)
+    
+    # Encrypt and shard the data
+    shards, metadata = engine.encrypt_and_shard(original_data)
+    
+    print(f"\n[STORAGE] Data distributed across {len(shards)} storage nodes")
+    print(f"[STORAGE] Each node holds one encrypted shard")
+    
+    # Simulate distributed storage: only 3 out of 5 shards available
+    available_shards = [shards[0], shards[2], shards[4]]
+    available_ids = [0, 2, 4]
+    
+    print(f"\n[SCENARIO] Simulating retrieval: Nodes 0, 2, 4 available")
+    print(f"[SCENARIO] Nodes 1, 3 offline/unavailable")
+    
+    # Recover and decrypt
+    recovered_data = engine.recover_and_decrypt(
+        available_shards, 
+        available_ids, 
+        metadata
+    )
+    
+    # Verify correctness
+    assert recovered_data == original_data, "Data integrity compromised!"
+    print(f"\n[SUCCESS] ✓ Data recovered successfully: {recovered_data.decode()}")
+    
+    # ========================================================================
+    # SCENARIO 2: Security Test - Tampered Shard Detection
+    # ========================================================================
+    print("\n" + "="*70)
+    print("SCENARIO 2: Tamper Detection - Modified Shard")
+    print("="*70)
+    
+    # Simulate attacker tampering with a shard
+    tampered_shards = available_shards.copy()
+    tampered_shards[1] = b"TAMPERED_DATA" + tampered_shards[1][13:]  # Modify shard
+    
+    print(f"\n[ATTACK] Simulating attacker modifying shard 2...")
+    print(f"[ATTACK] Original shard hash: {metadata[2].hex()[:16]}...")
+    
+    try:
+        # Attempt recovery with tampered shard
+        engine.recover_and_decrypt(
+            tampered_shards,
+            available_ids,
+            metadata
+        )
+        print("[FAILURE] ✗ Tampering NOT detected - SECURITY BREACH!")
+    except ValueError as e:
+        print(f"\n[SUCCESS] ✓ Tampering detected and blocked!")
+        print(f"[SUCCESS] ✓ Error: {str(e)}")
+    
+    # ========================================================================
+    # SCENARIO 3: Insufficient Shards
+    # ========================================================================
+    print("\n" + "="*70)
+    print("SCENARIO 3: Availability Test - Insufficient Shards")
+    print("="*70)
+    
+    insufficient_shards = [shards[0], shards[1]]  # Only 2 shards
+    insufficient_ids = [0, 1]
+    
+    print(f"\n[SCENARIO] Only 2 shards available (need {engine.k_required})")
+    
+    try:
+        engine.recover_and_decrypt(
+            insufficient_shards,
+            insufficient_ids,
+            metadata
+        )
+        print("[FAILURE] ✗ Should not succeed with insufficient shards!")
+    except ValueError as e:
+        print(f"\n[SUCCESS] ✓ Correctly rejected insufficient shards")
+        print(f"[SUCCESS] ✓ Error: {str(e)}")
+    
+    # ========================================================================
+    # SCENARIO 4: Legacy Cipher Round-Trip (use_fernet flag)
+    # ========================================================================
+    print("\n" + "="*70)
+    print("SCENARIO 4: Legacy Fernet Compatibility Round-Trip")
+    print("="*70)
+
+    legacy_engine = DecentralizedStorageEngine(
+        encryption_key=engine.encryption_key, use_fernet=True
+    )
+    legacy_shards, legacy_metadata = legacy_engine.encrypt_and_shard(original_data)
+    legacy_recovered = legacy_engine.recover_and_decrypt(
+        legacy_shards[:legacy_engine.k_required],
+        list(range(legacy_engine.k_required)),
+        legacy_metadata
+    )
+    assert legacy_recovered == original_data, "Fernet round-trip failed!"
+    print(f"\n[SUCCESS] ✓ Fernet-mode engine round-trips its own data")
+
+    print("\n" + "="*70)
+    print("SECURITY DEMONSTRATION COMPLETE")
+    print("="*70)
+    print("\n[SUMMARY] Security Properties Verified:")
+    print("  ✓ Confidentiality: Data encrypted before sharding")
+    print("  ✓ Availability: Any 3 of 5 shards can recover data")
+    print("  ✓ Integrity: SHA-256 detects tampering")
+    print("  ✓ Fail-Safe: Tampered shards rejected before decryption")
+    print("  ✓ Compatibility: Legacy Fernet cipher round-trips")
+
+
+if __name__ == "__main__":
+    # Install required packages:
+    # pip install cryptography zfec
+    
+    demonstrate_secure_storage()
@@ -1,601 +1,1107 @@
-import asyncio
-import json
-import hashlib
-import os
-from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-import httpx
-from cryptography.fernet import Fernet
-from decentralized_storage_engine import DecentralizedStorageEngine
-
-
-class StorageOrchestrator:
-    """
-    Coordinates distributed storage across multiple nodes.
-    Handles encryption, sharding, distribution, and retrieval with fault tolerance.
-    
-    Security Features:
-    - Master key encryption for metadata (envelope pattern)
-    - Atomic uploads with rollback on failure
-    - Mandatory integrity verification
-    """
-    
-    def __init__(self, 
-                 node_urls: List[str], 
-                 storage_engine: Optional[DecentralizedStorageEngine] = None,
-                 metadata_dir: str = "metadata"):
-        """
-        Initialize the orchestrator with storage nodes and engine.
-        
-        Args:
-            node_urls: List of storage node URLs (e.g., ['http://localhost:8001', ...])
-            storage_engine: Instance of DecentralizedStorageEngine. Creates new if None.
-            metadata_dir: Directory to store metadata manifests
-        """
-        self.node_urls = node_urls
-        self.storage_engine = storage_engine or DecentralizedStorageEngine()
-        self.metadata_dir = Path(metadata_dir)
-        self.metadata_dir.mkdir(exist_ok=True)
-        
-        # Initialize master key for metadata encryption (envelope pattern)
-        self._init_master_key()
-        
-        # Upload locks to prevent concurrent uploads of same file
-        self._upload_locks = {}
-        
-        print(f"[ORCHESTRATOR] Initialized with {len(node_urls)} nodes")
-        for i, url in enumerate(node_urls):
-            print(f"  Node {i}: {url}")
-    
-    
-    def _init_master_key(self):
-        """
-        Initialize master key for metadata encryption (envelope pattern).
-        
-        The master key encrypts all metadata files, preventing plaintext
-        exposure of file encryption keys on disk.
-        
-        Security: Load from environment variable MASTER_VAULT_KEY.
-        If not set, generate and warn (for development only).
-        """
-        master_key_b64 = os.environ.get('MASTER_VAULT_KEY')
-        
-        if master_key_b64:
-            try:
-                self.master_key = master_key_b64.encode()
-                self.metadata_cipher = Fernet(self.master_key)
-                print("[SECURITY] Master vault key loaded from environment ✓")
-            except Exception as e:
-                print(f"[SECURITY ERROR] Invalid MASTER_VAULT_KEY: {e}")
-                raise
-        else:
-            # Development mode: generate temporary key
-            self.master_key = Fernet.generate_key()
-            self.metadata_cipher = Fernet(self.master_key)
-            print("[SECURITY WARNING] MASTER_VAULT_KEY not set - generating temporary key")
-            print(f"[SECURITY WARNING] For production, set: MASTER_VAULT_KEY={self.master_key.decode()}")
-            print("[SECURITY WARNING] Metadata will not be recoverable after restart!")
-    
-    
-    def _calculate_file_hash(self, data: bytes) -> str:
-        """Calculate SHA-256 hash of entire file."""
-        return hashlib.sha256(data).hexdigest()
-    
-    
-    async def _check_node_health(self, node_url: str) -> bool:
-        """
-        Check if a node is online and responsive.
-        
-        Args:
-            node_url: URL of the node to check
-            
-        Returns:
-            True if node is healthy, False otherwise
-        """
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{node_url}/heartbeat")
-                return response.status_code == 200
-        except Exception as e:
-            print(f"[WARNING] Node {node_url} health check failed: {e}")
-            return False
-    
-    
-    async def _upload_shard_to_node(self, 
-                                    node_url: str, 
-                                    shard_id: str, 
-                                    shard_data: bytes) -> bool:
-        """
-        Upload a single shard to a storage node.
-        
-        Args:
-            node_url: URL of the target node
-            shard_id: Unique identifier for the shard
-            shard_data: Encrypted shard bytes
-            
-        Returns:
-            True if upload successful, False otherwise
-        """
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                files = {"file": (shard_id, shard_data, "application/octet-stream")}
-                response = await client.post(
-                    f"{node_url}/upload/{shard_id}",
-                    files=files
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    print(f"[UPLOAD] ✓ Shard {shard_id} → {node_url} ({result['size']} bytes)")
-                    return True
-                else:
-                    print(f"[ERROR] Upload to {node_url} failed: {response.status_code}")
-                    return False
-                    
-        except Exception as e:
-            print(f"[ERROR] Upload to {node_url} failed: {e}")
-            return False
-    
-    
-    async def _download_shard_from_node(self, 
-                                       node_url: str, 
-                                       shard_id: str) -> Optional[bytes]:
-        """
-        Download a single shard from a storage node.
-        
-        Args:
-            node_url: URL of the node
-            shard_id: Unique identifier for the shard
-            
-        Returns:
-            Shard data bytes if successful, None otherwise
-        """
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(f"{node_url}/download/{shard_id}")
-                
-                if response.status_code == 200:
-                    print(f"[DOWNLOAD] ✓ Shard {shard_id} ← {node_url} ({len(response.content)} bytes)")
-                    return response.content
-                else:
-                    print(f"[WARNING] Download from {node_url} failed: {response.status_code}")
-                    return None
-                    
-        except Exception as e:
-            print(f"[WARNING] Download from {node_url} failed: {e}")
-            return None
-    
-    
-    async def _delete_shard_from_node(self, 
-                                     node_url: str, 
-                                     shard_id: str) -> bool:
-        """
-        Delete a shard from a storage node (for rollback).
-        
-        Args:
-            node_url: URL of the node
-            shard_id: Unique identifier for the shard
-            
-        Returns:
-            True if deletion successful, False otherwise
-        """
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.delete(f"{node_url}/delete/{shard_id}")
-                
-                if response.status_code == 200:
-                    print(f"[ROLLBACK] ✓ Deleted shard {shard_id} from {node_url}")
-                    return True
-                else:
-                    print(f"[ROLLBACK WARNING] Delete failed: {response.status_code}")
-                    return False
-                    
-        except Exception as e:
-            print(f"[ROLLBACK WARNING] Delete from {node_url} failed: {e}")
-            return False
-    
-    
-    async def upload_file(self, file_path: str) -> str:
-        """
-        Upload a file with atomic transaction semantics and rollback.
-        
-        Security Features:
-        - Atomic uploads: All shards uploaded or none (rollback on failure)
-        - Encrypted metadata: Master key protects encryption keys on disk
-        - Upload locking: Prevents concurrent uploads of same file
-        
-        Process:
-        1. Acquire file lock to prevent concurrent uploads
-        2. Encrypt and shard file
-        3. Upload all shards (track for potential rollback)
-        4. On success: Save encrypted metadata
-        5. On failure: Rollback (delete uploaded shards)
-        
-        Args:
-            file_path: Path to the file to upload
-            
-        Returns:
-            Path to the generated encrypted metadata file
-            
-        Raises:
-            ValueError: If insufficient nodes available or upload fails
-        """
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        filename = file_path.name
-        
-        # Acquire lock for this filename to prevent concurrent uploads
-        if filename not in self._upload_locks:
-            self._upload_locks[filename] = asyncio.Lock()
-        
-        async with self._upload_locks[filename]:
-            return await self._upload_file_atomic(file_path)
-    
-    
-    async def _upload_file_atomic(self, file_path: Path) -> str:
-        """
-        Internal atomic upload with rollback on failure.
-        
-        This ensures that either all shards are uploaded successfully,
-        or all partial uploads are cleaned up (all-or-nothing).
-        """
-        print(f"\n{'='*70}")
-        print(f"UPLOAD: {file_path.name}")
-        print(f"{'='*70}")
-        
-        uploaded_shards = []  # Track for rollback
-        
-        try:
-            # Read file data
-            with open(file_path, "rb") as f:
-                file_data = f.read()
-            
-            file_hash = self._calculate_file_hash(file_data)
-            print(f"[FILE] Size: {len(file_data)} bytes")
-            print(f"[FILE] Hash: {file_hash[:32]}...")
-            
-            # Step 1: Encrypt and shard
-            shards, shard_metadata = self.storage_engine.encrypt_and_shard(file_data)
-            
-            # Verify we have enough nodes
-            if len(self.node_urls) < len(shards):
-                raise ValueError(
-                    f"Insufficient nodes: {len(self.node_urls)} available, "
-                    f"{len(shards)} required for {self.storage_engine.m_total}-way distribution"
-                )
-            
-            # Step 2: Check node health
-            print(f"\n[HEALTH] Checking node availability...")
-            health_checks = await asyncio.gather(
-                *[self._check_node_health(url) for url in self.node_urls]
-            )
-            
-            healthy_nodes = [url for url, healthy in zip(self.node_urls, health_checks) if healthy]
-            print(f"[HEALTH] {len(healthy_nodes)} of {len(self.node_urls)} nodes online")
-            
-            if len(healthy_nodes) < len(shards):
-                raise ValueError(
-                    f"Insufficient healthy nodes: {len(healthy_nodes)} online, "
-                    f"{len(shards)} required"
-                )
-            
-            # Step 3: Distribute shards to nodes (track for rollback)
-            print(f"\n[DISTRIBUTE] Uploading {len(shards)} shards (atomic transaction)...")
-            
-            shard_distribution = {}  # Maps shard_id -> node_url
-            upload_tasks = []
-            
-            for shard_id, shard_data in enumerate(shards):
-                node_url = healthy_nodes[shard_id]
-                shard_identifier = f"{file_path.stem}_shard_{shard_id}"
-                shard_distribution[shard_id] = {
-                    "node_url": node_url,
-                    "shard_identifier": shard_identifier
-                }
-                
-                # Track for potential rollback
-                uploaded_shards.append((node_url, shard_identifier))
-                
-                upload_tasks.append(
-                    self._upload_shard_to_node(node_url, shard_identifier, shard_data)
-                )
-            
-            # Execute uploads concurrently
-            upload_results = await asyncio.gather(*upload_tasks)
-            
-            # Verify all uploads succeeded
-            failed_uploads = sum(1 for result in upload_results if not result)
-            if failed_uploads > 0:
-                raise ValueError(
-                    f"[TRANSACTION FAILED] {failed_uploads} shard uploads failed. "
-                    f"Initiating rollback..."
-                )
-            
-            print(f"\n[ATOMIC SUCCESS] All {len(shards)} shards uploaded successfully ✓")
-            
-            # Step 4: Create metadata manifest (with sensitive key)
-            metadata_manifest = {
-                "filename": file_path.name,
-                "file_hash": file_hash,
-                "file_size": len(file_data),
-                "encryption_key": self.storage_engine.encryption_key.decode(),
-                "k_required": self.storage_engine.k_required,
-                "m_total": self.storage_engine.m_total,
-                "shard_metadata": {
-                    str(shard_id): {
-                        "hash": shard_hash,
-                        "node_url": shard_distribution[shard_id]["node_url"],
-                        "shard_identifier": shard_distribution[shard_id]["shard_identifier"]
-                    }
-                    for shard_id, shard_hash in shard_metadata.items()
-                }
-            }
-            
-            # Step 5: Save ENCRYPTED metadata (envelope pattern)
-            metadata_path = self.metadata_dir / f"{file_path.stem}.metadata.json"
-            self._save_encrypted_metadata(metadata_manifest, metadata_path)
-            
-            print(f"[METADATA] Encrypted and saved to: {metadata_path} ✓")
-            print(f"[SECURITY] Encryption key protected by master vault key ✓")
-            print(f"{'='*70}\n")
-            
-            return str(metadata_path)
-            
-        except Exception as e:
-            # Rollback: Delete all uploaded shards
-            print(f"\n[ROLLBACK] Upload failed: {e}")
-            print(f"[ROLLBACK] Cleaning up {len(uploaded_shards)} uploaded shards...")
-            
-            delete_tasks = [
-                self._delete_shard_from_node(node_url, shard_id)
-                for node_url, shard_id in uploaded_shards
-            ]
-            
-            delete_results = await asyncio.gather(*delete_tasks, return_exceptions=True)
-            successful_deletions = sum(1 for r in delete_results if r is True)
-            
-            print(f"[ROLLBACK] Cleaned up {successful_deletions}/{len(uploaded_shards)} shards")
-            print(f"[ROLLBACK] Transaction aborted - no orphaned data ✓")
-            
-            # Re-raise original exception
-            raise
-    
-    def _save_encrypted_metadata(self, metadata: dict, path: Path):
-        """
-        Save metadata to disk with master key encryption (envelope pattern).
-        
-        This prevents plaintext exposure of file encryption keys.
-        
-        Args:
-            metadata: Metadata dictionary (contains sensitive encryption_key)
-            path: Path to save encrypted metadata file
-        """
-        # Serialize metadata to JSON
-        metadata_json = json.dumps(metadata, indent=2)
-        metadata_bytes = metadata_json.encode('utf-8')
-        
-        # Encrypt with master key
-        encrypted_metadata = self.metadata_cipher.encrypt(metadata_bytes)
-        
-        # Write encrypted bytes to disk
-        with open(path, 'wb') as f:
-            f.write(encrypted_metadata)
-        
-        print(f"[SECURITY] Metadata encrypted with master vault key")
-    
-    
-    def _load_encrypted_metadata(self, path: Path) -> dict:
-        """
-        Load and decrypt metadata from disk.
-        
-        Args:
-            path: Path to encrypted metadata file
-            
-        Returns:
-            Decrypted metadata dictionary
-            
-        Raises:
-            ValueError: If decryption fails (wrong key or corrupted file)
-        """
-        try:
-            # Read encrypted bytes
-            with open(path, 'rb') as f:
-                encrypted_metadata = f.read()
-            
-            # Decrypt with master key
-            metadata_bytes = self.metadata_cipher.decrypt(encrypted_metadata)
-            metadata_json = metadata_bytes.decode('utf-8')
-            
-            # Parse JSON
-            metadata = json.loads(metadata_json)
-            
-            print(f"[SECURITY] Metadata decrypted successfully ✓")
-            return metadata
-            
-        except Exception as e:
-            raise ValueError(
-                f"Failed to decrypt metadata. Wrong MASTER_VAULT_KEY or corrupted file: {e}"
-            )
-    
-    
-    async def download_file(self, 
-                           metadata_path: str, 
-                           output_path: Optional[str] = None) -> str:
-        """
-        Download and reconstruct a file from distributed shards.
-        
-        Security: Metadata is decrypted using master key, then file is
-        reconstructed with mandatory integrity verification.
-        
-        Args:
-            metadata_path: Path to the encrypted .metadata.json file
-            output_path: Where to save the reconstructed file (defaults to original filename)
-            
-        Returns:
-            Path to the reconstructed file
-            
-        Raises:
-            ValueError: If insufficient shards can be retrieved
-            ValueError: If metadata decryption fails
-        """
-        metadata_path = Path(metadata_path)
-        
-        if not metadata_path.exists():
-            raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
-        
-        # Step 1: Load and decrypt metadata manifest
-        metadata = self._load_encrypted_metadata(metadata_path)
-        
-        print(f"\n{'='*70}")
-        print(f"DOWNLOAD: {metadata['filename']}")
-        print(f"{'='*70}")
-        print(f"[METADATA] Loaded and decrypted from: {metadata_path}")
-        print(f"[FILE] Original size: {metadata['file_size']} bytes")
-        print(f"[FILE] Original hash: {metadata['file_hash'][:32]}...")
-        print(f"[RECOVERY] Need {metadata['k_required']} of {metadata['m_total']} shards")
-        
-        # Recreate storage engine with the original encryption key (from decrypted metadata)
-        temp_engine = DecentralizedStorageEngine(
-            encryption_key=metadata['encryption_key'].encode()
-        )
-        
-        # Step 2: Attempt to download shards
-        print(f"\n[DOWNLOAD] Fetching shards from nodes...")
-        
-        shard_info = metadata['shard_metadata']
-        download_tasks = []
-        shard_ids = []
-        
-        for shard_id_str, info in shard_info.items():
-            shard_id = int(shard_id_str)
-            shard_ids.append(shard_id)
-            download_tasks.append(
-                self._download_shard_from_node(
-                    info['node_url'],
-                    info['shard_identifier']
-                )
-            )
-        
-        # Execute downloads concurrently
-        downloaded_shards = await asyncio.gather(*download_tasks)
-        
-        # Step 3: Filter successful downloads
-        successful_shards = []
-        successful_ids = []
-        original_shard_metadata = {}
-        
-        for shard_id, shard_data in zip(shard_ids, downloaded_shards):
-            if shard_data is not None:
-                successful_shards.append(shard_data)
-                successful_ids.append(shard_id)
-                original_shard_metadata[shard_id] = shard_info[str(shard_id)]['hash']
-        
-        print(f"\n[RESULT] Successfully retrieved {len(successful_shards)} shards")
-        
-        # Step 4: Verify we have enough shards
-        if len(successful_shards) < metadata['k_required']:
-            raise ValueError(
-                f"Insufficient shards retrieved: {len(successful_shards)} available, "
-                f"{metadata['k_required']} required. Data cannot be recovered."
-            )
-        
-        # Step 5: Recover and decrypt (with MANDATORY integrity verification)
-        print(f"\n[RECONSTRUCT] Reconstructing file from {len(successful_shards)} shards...")
-        
-        try:
-            reconstructed_data = temp_engine.recover_and_decrypt(
-                successful_shards,
-                successful_ids,
-                original_shard_metadata
-            )
-        except ValueError as e:
-            raise ValueError(f"Reconstruction failed: {e}")
-        
-        # Step 6: Verify file integrity
-        reconstructed_hash = self._calculate_file_hash(reconstructed_data)
-        
-        if reconstructed_hash != metadata['file_hash']:
-            raise ValueError(
-                f"File integrity check FAILED!\n"
-                f"Expected: {metadata['file_hash']}\n"
-                f"Got: {reconstructed_hash}"
-            )
-        
-        print(f"[INTEGRITY] ✓ File hash verified: {reconstructed_hash[:32]}...")
-        
-        # Step 7: Save reconstructed file
-        if output_path is None:
-            output_path = Path("downloads") / metadata['filename']
-        else:
-            output_path = Path(output_path)
-        
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_path, "wb") as f:
-            f.write(reconstructed_data)
-        
-        print(f"[SUCCESS] File saved to: {output_path}")
-        print(f"{'='*70}\n")
-        
-        return str(output_path)
-
-
-async def demonstrate_orchestrator():
-    """
-    Example demonstration of the StorageOrchestrator.
-    """
-    print("="*70)
-    print("STORAGE ORCHESTRATOR DEMONSTRATION")
-    print("="*70)
-    
-    # Define storage nodes (should be running on these ports)
-    node_urls = [
-        "http://localhost:8001",
-        "http://localhost:8002",
-        "http://localhost:8003",
-        "http://localhost:8004",
-        "http://localhost:8005"
-    ]
-    
-    # Initialize orchestrator (uses its own engine)
-    from decentralized_storage_engine import DecentralizedStorageEngine
-    orchestrator = StorageOrchestrator(node_urls)
-    
-    # Create a test file
-    test_file = Path("test_upload.txt")
-    test_data = b"This is confidential data for the decentralized storage system demo!"
-    
-    with open(test_file, "wb") as f:
-        f.write(test_data)
-    
-    print(f"\n[TEST] Created test file: {test_file}")
-    
-    # Upload the file
-    try:
-        metadata_path = await orchestrator.upload_file(str(test_file))
-        print(f"[TEST] Upload completed. Metadata: {metadata_path}")
-        
-        # Download the file
-        downloaded_path = await orchestrator.download_file(metadata_path)
-        print(f"[TEST] Download completed: {downloaded_path}")
-        
-        # Verify content
-        with open(downloaded_path, "rb") as f:
-            downloaded_data = f.read()
-        
-        if downloaded_data == test_data:
-            print(f"\n[SUCCESS] ✓ File content verified - system working correctly!")
-        else:
-            print(f"\n[FAILURE] ✗ File content mismatch!")
-            
-    except Exception as e:
-        print(f"\n[ERROR] Demonstration failed: {e}")
-        print(f"[NOTE] Make sure storage nodes are running on ports 8001-8005")
-        print(f"[NOTE] Start nodes with: python node.py --port 8001 (and similar)")
-
-
-if __name__ == "__main__":
-    asyncio.run(demonstrate_orchestrator())
+import asyncio
+import base64
+import json
+import hashlib
+import logging
+import mmap
+import os
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+import httpx
+
+try:
+    # C-accelerated JSON for the manifest hot path; stdlib fallback below
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Optional manifest compression: JSON manifests are mostly repeated
+    # node URLs, shard-identifier prefixes and hashes, which zstd shrinks
+    # ~3x - proportionally less AEAD work and disk I/O per manifest
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from decentralized_storage_engine import DecentralizedStorageEngine
+
+# Metadata envelope format: a 1-byte version prefix, then the payload.
+# Version 2 is nonce(12) || AES-256-GCM ciphertext+tag over raw JSON;
+# version 3 is the same envelope over zstd-compressed JSON. Files without
+# a recognised version byte are legacy Fernet tokens (those are base64,
+# so they start with printable ASCII and can never collide with 0x02/0x03).
+_METADATA_VERSION_GCM = 0x02
+_METADATA_VERSION_GCM_ZSTD = 0x03
+_METADATA_AAD = b"orchestrator-metadata-v1"
+
+# Health probes are opportunistic (the upload itself is the real test),
+# so they get a short deadline by default; when that leaves too few
+# nodes for an upload, the missing ones are re-probed with the relaxed
+# deadline before giving up. Only upload failures blacklist a node -
+# a slow heartbeat alone never does - and a blacklisted node that
+# passes a relaxed re-probe is cleared early.
+_HEALTH_PROBE_TIMEOUT = 0.25
+_HEALTH_RETRY_TIMEOUT = 5.0
+_NODE_BLACKLIST_TTL = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+def _writev_all(fd: int, batch: list):
+    """
+    Write every byte of a batch of buffers with os.writev.
+
+    writev may write fewer bytes than requested (ENOSPC pressure, iovec
+    limits); a silently short write would truncate the output while the
+    in-memory integrity hash still matched, so keep issuing writev for
+    the unwritten tail until the batch is fully on disk.
+    """
+    remaining = list(batch)
+    while remaining:
+        written = os.writev(fd, remaining)
+        if written == sum(len(buf) for buf in remaining):
+            return
+        # Skip fully written buffers and trim the partially written one
+        trimmed = []
+        for buf in remaining:
+            if written >= len(buf):
+                written -= len(buf)
+            elif written:
+                trimmed.append(memoryview(buf)[written:])
+                written = 0
+            else:
+                trimmed.append(buf)
+        remaining = trimmed
+
+
+class StorageOrchestrator:
+    """
+    Coordinates distributed storage across multiple nodes.
+    Handles encryption, sharding, distribution, and retrieval with fault tolerance.
+    
+    Security Features:
+    - Master key encryption for metadata (envelope pattern)
+    - Atomic uploads with rollback on failure
+    - Mandatory integrity verification
+    """
+    
+    def __init__(self, 
+                 node_urls: List[str], 
+                 storage_engine: Optional[DecentralizedStorageEngine] = None,
+                 metadata_dir: str = "metadata"):
+        """
+        Initialize the orchestrator with storage nodes and engine.
+        
+        Args:
+            node_urls: List of storage node URLs (e.g., ['http://localhost:8001', ...])
+            storage_engine: Instance of DecentralizedStorageEngine. Creates new if None.
+            metadata_dir: Directory to store metadata manifests
+        """
+        self.node_urls = node_urls
+        self.storage_engine = storage_engine or DecentralizedStorageEngine()
+        self.metadata_dir = Path(metadata_dir)
+        self.metadata_dir.mkdir(exist_ok=True)
+        
+        # Initialize master key for metadata encryption (envelope pattern)
+        self._init_master_key()
+
+        # One shared HTTP client: connection pooling and keep-alive (plus
+        # HTTP/2 multiplexing when the h2 extra is installed) remove a
+        # TCP handshake from every shard transfer and health probe.
+        # Per-request deadlines are passed with timeout= at each call.
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+        try:
+            self._client = httpx.AsyncClient(http2=True, limits=limits)
+        except ImportError:
+            self._client = httpx.AsyncClient(limits=limits)
+
+        # Hot-path specialisation: bind the client methods and prebuild
+        # per-node endpoint prefixes once, so per-shard calls skip the
+        # attribute lookups and f-string formatting. The .get() fallbacks
+        # cover node URLs read from manifests that predate a config change.
+        self._post = self._client.post
+        self._get = self._client.get
+        self._delete = self._client.delete
+        self._stream = self._client.stream
+        self._upload_prefix = {url: f"{url}/upload/" for url in node_urls}
+        self._download_prefix = {url: f"{url}/download/" for url in node_urls}
+        self._delete_prefix = {url: f"{url}/delete/" for url in node_urls}
+        self._heartbeat_url = {url: f"{url}/heartbeat" for url in node_urls}
+        
+        # Failure blacklist: node_url -> monotonic deadline until which
+        # the node is skipped without probing (see _mark_node_unhealthy)
+        self._node_state: Dict[str, float] = {}
+
+        # Smoothed heartbeat round-trip time per node (EWMA); uploads
+        # assign shards to the fastest nodes first so the gather is not
+        # bounded by a slow node that a faster one could have replaced
+        self._node_rtt: Dict[str, float] = {}
+
+        # Upload locks to prevent concurrent uploads of the same file.
+        # A WeakValueDictionary keeps an entry only while some coroutine
+        # still holds the lock object, so the registry cannot grow without
+        # bound over the lifetime of a long-running orchestrator. The
+        # guard serialises check-and-insert.
+        self._upload_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = \
+            weakref.WeakValueDictionary()
+        self._upload_locks_guard = asyncio.Lock()
+
+        # LRU cache of decrypted manifests keyed by (path, mtime_ns,
+        # size): repeat downloads of the same file skip the Fernet
+        # decrypt + JSON parse entirely, and any rewrite of the manifest
+        # changes the key. Entries are shared dicts - callers must copy
+        # before mutating (the gateway already does for redaction).
+        self._meta_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._meta_cache_max = 128
+
+        # Small LRU of per-file engines keyed by (encryption key, aead):
+        # repeat downloads of the same file reuse the engine instead of
+        # re-decoding the key and rebuilding cipher state every time.
+        # The engine module's cipher cache is bounded to the same 8
+        # entries, so an eviction here really does release key material
+        self._engine_cache: "OrderedDict[tuple, DecentralizedStorageEngine]" = OrderedDict()
+        self._engine_cache_max = 8
+
+        # In-memory index: filename -> metadata path. Avoids decrypting
+        # every manifest on disk just to locate one file (O(N) Fernet
+        # operations per download otherwise). Populated by one scan here,
+        # kept current on every successful upload.
+        self._metadata_index: Dict[str, Path] = {}
+        self._rebuild_metadata_index()
+
+        logger.info("[ORCHESTRATOR] Initialized with %d nodes: %s",
+                    len(node_urls), ", ".join(node_urls))
+    
+    
+    def _init_master_key(self):
+        """
+        Initialize master key for metadata encryption (envelope pattern).
+        
+        The master key encrypts all metadata files, preventing plaintext
+        exposure of file encryption keys on disk.
+        
+        Security: Load from environment variable MASTER_VAULT_KEY.
+        If not set, generate and warn (for development only).
+        """
+        master_key_b64 = os.environ.get('MASTER_VAULT_KEY')
+
+        if master_key_b64:
+            self.master_key = master_key_b64.encode()
+            logger.info("[SECURITY] Master vault key loaded from environment")
+        else:
+            # Development mode: generate temporary key
+            self.master_key = Fernet.generate_key()
+            logger.warning("[SECURITY] MASTER_VAULT_KEY not set - generating temporary key; "
+                           "metadata will not be recoverable after restart. "
+                           "For production, set: MASTER_VAULT_KEY=%s", self.master_key.decode())
+
+        # New manifests use AES-256-GCM (hardware AES-NI, single pass, no
+        # base64 inflation) with the same urlsafe-base64 key format; the
+        # Fernet cipher is kept only to read pre-existing manifests.
+        try:
+            self._metadata_aead = AESGCM(base64.urlsafe_b64decode(self.master_key))
+            self.metadata_cipher = Fernet(self.master_key)
+        except Exception:
+            logger.error("[SECURITY] Invalid MASTER_VAULT_KEY")
+            raise
+
+        # Reusable zstd contexts (they are cheap to call but not to
+        # build); level 3 is the speed/ratio sweet spot for small JSON
+        if zstd is not None:
+            self._zstd_compressor = zstd.ZstdCompressor(level=3)
+            self._zstd_decompressor = zstd.ZstdDecompressor()
+    
+    
+    async def aclose(self):
+        """Close the shared HTTP client and its pooled connections."""
+        await self._client.aclose()
+
+
+    def _rebuild_metadata_index(self):
+        """
+        Rescan the metadata directory and rebuild the filename -> path index.
+
+        Each manifest must be decrypted once to learn which filename it
+        belongs to; manifests that fail to decrypt (wrong key, corruption)
+        are skipped with a warning.
+        """
+        index: Dict[str, Path] = {}
+        for metadata_path in self.metadata_dir.glob("*.metadata.json"):
+            try:
+                metadata = self._load_encrypted_metadata(metadata_path)
+                index[metadata["filename"]] = metadata_path
+            except Exception as e:
+                logger.warning("Skipping unreadable metadata %s: %s", metadata_path, e)
+        self._metadata_index = index
+
+
+    def _metadata_path_for(self, filename: str) -> Path:
+        """
+        Deterministic manifest path for a filename.
+
+        Manifests are named by a truncated SHA-256 of the filename, so a
+        download resolves to its manifest with a single path check - no
+        decryption, no directory scan - and the (non-secret) filename is
+        not echoed into the directory listing.
+        """
+        digest = hashlib.sha256(filename.encode('utf-8')).hexdigest()[:16]
+        return self.metadata_dir / f"{digest}.metadata.json"
+
+
+    def lookup_metadata_path(self, filename: str) -> Optional[Path]:
+        """
+        Resolve a filename to its metadata manifest path.
+
+        The deterministic name is checked first (O(1)); legacy manifests
+        written under the old stem-based naming are found via the index,
+        which is rescanned once on a miss (read-through) so files
+        uploaded by another process are still found.
+
+        Args:
+            filename: Original filename as stored in the manifest
+
+        Returns:
+            Path to the encrypted metadata file, or None if unknown
+        """
+        deterministic = self._metadata_path_for(filename)
+        if deterministic.exists():
+            return deterministic
+
+        path = self._metadata_index.get(filename)
+        if path is not None and path.exists():
+            return path
+
+        self._rebuild_metadata_index()
+        return self._metadata_index.get(filename)
+
+
+    def _calculate_file_hash(self, data: bytes) -> str:
+        """Calculate SHA-256 hash of entire file."""
+        return hashlib.sha256(data).hexdigest()
+
+
+    def _calculate_file_hash_stream(self, path: Path) -> str:
+        """
+        Calculate the SHA-256 hash of a file incrementally.
+
+        Reads in 1 MiB chunks so multi-GB files are hashed without being
+        held in memory; hashlib dispatches to hardware SHA on modern
+        OpenSSL builds. Must stay SHA-256: download verifies the
+        reconstructed bytes against this hash via _calculate_file_hash.
+        """
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+    
+    
+    def _mark_node_unhealthy(self, node_url: str):
+        """Blacklist a node for _NODE_BLACKLIST_TTL seconds after a failure."""
+        self._node_state[node_url] = time.monotonic() + _NODE_BLACKLIST_TTL
+        logger.warning("[HEALTH] Node %s blacklisted for %.0fs", node_url, _NODE_BLACKLIST_TTL)
+
+    def _node_blacklisted(self, node_url: str) -> bool:
+        """True while a node's failure blacklist entry has not expired."""
+        expires = self._node_state.get(node_url)
+        if expires is None:
+            return False
+        if time.monotonic() >= expires:
+            del self._node_state[node_url]
+            return False
+        return True
+
+    async def _check_node_health(self,
+                                 node_url: str,
+                                 timeout: float = _HEALTH_PROBE_TIMEOUT,
+                                 use_blacklist: bool = True) -> bool:
+        """
+        Check if a node is online and responsive.
+
+        The default probe is opportunistic: blacklisted nodes are skipped
+        and the timeout is short - an upload attempt over the kept-alive
+        connection is the real test, and upload failures do the
+        blacklisting. A failed probe by itself never blacklists (a slow
+        heartbeat is not a dead node). Callers that want an authoritative
+        answer (the upload re-probe, the gateway /health endpoint) pass a
+        relaxed timeout and use_blacklist=False; a success then clears
+        any standing blacklist entry.
+
+        Args:
+            node_url: URL of the node to check
+            timeout: Probe deadline in seconds
+            use_blacklist: Skip nodes with an active blacklist entry
+
+        Returns:
+            True if node is healthy, False otherwise
+        """
+        if use_blacklist and self._node_blacklisted(node_url):
+            return False
+        try:
+            url = self._heartbeat_url.get(node_url) or f"{node_url}/heartbeat"
+            started = time.perf_counter()
+            response = await self._get(url, timeout=timeout)
+            if response.status_code == 200:
+                # EWMA smooths one-off hiccups while still tracking drift
+                rtt = time.perf_counter() - started
+                previous = self._node_rtt.get(node_url)
+                self._node_rtt[node_url] = (
+                    rtt if previous is None else 0.8 * previous + 0.2 * rtt
+                )
+                # A node that answers is healthy regardless of history
+                self._node_state.pop(node_url, None)
+                return True
+            return False
+        except Exception as e:
+            logger.warning("[HEALTH] Node %s health check failed: %s", node_url, e)
+            return False
+    
+    
+    async def _upload_shard_to_node(self, 
+                                    node_url: str, 
+                                    shard_id: str, 
+                                    shard_data: bytes) -> bool:
+        """
+        Upload a single shard to a storage node.
+        
+        Args:
+            node_url: URL of the target node
+            shard_id: Unique identifier for the shard
+            shard_data: Encrypted shard bytes
+            
+        Returns:
+            True if upload successful, False otherwise
+        """
+        try:
+            # Send the shard as a raw octet-stream body: no multipart
+            # framing, so httpx does not re-buffer the payload. httpx only
+            # treats bytes as a single body, so materialise views first.
+            if not isinstance(shard_data, bytes):
+                shard_data = bytes(shard_data)
+            prefix = self._upload_prefix.get(node_url) or f"{node_url}/upload/"
+            response = await self._post(
+                prefix + shard_id,
+                content=shard_data,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=30.0
+            )
+
+            if response.status_code == 200:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[UPLOAD] shard=%s node=%s size=%s",
+                                 shard_id, node_url, response.json().get('size'))
+                return True
+            else:
+                logger.error("[UPLOAD] shard=%s node=%s status=%d",
+                             shard_id, node_url, response.status_code)
+                return False
+                    
+        except Exception as e:
+            logger.error("[UPLOAD] shard=%s node=%s failed: %s", shard_id, node_url, e)
+            self._mark_node_unhealthy(node_url)
+            return False
+    
+    
+    async def _download_shard_from_node(self, 
+                                       node_url: str, 
+                                       shard_id: str) -> Optional[bytes]:
+        """
+        Download a single shard from a storage node.
+        
+        Args:
+            node_url: URL of the node
+            shard_id: Unique identifier for the shard
+            
+        Returns:
+            Shard data bytes if successful, None otherwise
+        """
+        try:
+            # Stream the response body in 1 MiB chunks into one growable
+            # buffer instead of letting httpx accumulate its own copy
+            # first; keeps backpressure on large shards
+            prefix = self._download_prefix.get(node_url) or f"{node_url}/download/"
+            async with self._stream(
+                "GET", prefix + shard_id, timeout=30.0
+            ) as response:
+                if response.status_code == 200:
+                    buffer = bytearray()
+                    async for chunk in response.aiter_bytes(1 << 20):
+                        buffer += chunk
+                    logger.debug("[DOWNLOAD] shard=%s node=%s size=%d", shard_id, node_url, len(buffer))
+                    return bytes(buffer)
+                else:
+                    logger.warning("[DOWNLOAD] shard=%s node=%s status=%d",
+                                   shard_id, node_url, response.status_code)
+                    return None
+                    
+        except Exception as e:
+            logger.warning("[DOWNLOAD] shard=%s node=%s failed: %s", shard_id, node_url, e)
+            return None
+    
+    
+    async def _delete_shard_from_node(self, 
+                                     node_url: str, 
+                                     shard_id: str) -> bool:
+        """
+        Delete a shard from a storage node (for rollback).
+        
+        Args:
+            node_url: URL of the node
+            shard_id: Unique identifier for the shard
+            
+        Returns:
+            True if deletion successful, False otherwise
+        """
+        try:
+            prefix = self._delete_prefix.get(node_url) or f"{node_url}/delete/"
+            response = await self._delete(prefix + shard_id, timeout=10.0)
+
+            if response.status_code == 200:
+                logger.debug("[ROLLBACK] deleted shard=%s node=%s", shard_id, node_url)
+                return True
+            else:
+                logger.warning("[ROLLBACK] delete shard=%s node=%s status=%d",
+                               shard_id, node_url, response.status_code)
+                return False
+
+        except Exception as e:
+            logger.warning("[ROLLBACK] delete shard=%s node=%s failed: %s", shard_id, node_url, e)
+            return False
+    
+    
+    async def upload_file(self, file_path: str) -> str:
+        """
+        Upload a file with atomic transaction semantics and rollback.
+        
+        Security Features:
+        - Atomic uploads: All shards uploaded or none (rollback on failure)
+        - Encrypted metadata: Master key protects encryption keys on disk
+        - Upload locking: Prevents concurrent uploads of same file
+        
+        Process:
+        1. Acquire file lock to prevent concurrent uploads
+        2. Encrypt and shard file
+        3. Upload all shards (track for potential rollback)
+        4. On success: Save encrypted metadata
+        5. On failure: Rollback (delete uploaded shards)
+        
+        Args:
+            file_path: Path to the file to upload
+            
+        Returns:
+            Path to the generated encrypted metadata file
+            
+        Raises:
+            ValueError: If insufficient nodes available or upload fails
+        """
+        file_path = Path(file_path)
+        
+        if not file_path.exists():
+            raise FileNotFoundError(f"File not found: {file_path}")
+        
+        filename = file_path.name
+        
+        # Acquire lock for this filename to prevent concurrent uploads.
+        # The local reference keeps the lock alive in the weak registry
+        # for as long as this upload runs.
+        async with self._upload_locks_guard:
+            lock = self._upload_locks.get(filename)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._upload_locks[filename] = lock
+
+        async with lock:
+            return await self._upload_file_atomic(file_path)
+    
+    
+    async def _upload_file_atomic(self, file_path: Path) -> str:
+        """
+        Internal atomic upload with rollback on failure.
+        
+        This ensures that either all shards are uploaded successfully,
+        or all partial uploads are cleaned up (all-or-nothing).
+        """
+        logger.info("[UPLOAD] Starting atomic upload of %s", file_path.name)
+
+        
+        uploaded_shards = []  # Track for rollback
+        
+        try:
+            # Hash the file incrementally instead of reading it into RAM
+            # just to hash it; the read loop runs on a worker thread so
+            # the event loop is not stalled on disk
+            file_size = file_path.stat().st_size
+            file_hash = await asyncio.to_thread(self._calculate_file_hash_stream, file_path)
+            logger.debug("[FILE] size=%d hash=%s", file_size, file_hash)
+
+            # Kick off the health probes now so their network round trips
+            # overlap the CPU-bound encrypt+shard step below (the OpenSSL
+            # calls release the GIL, so the event loop keeps running)
+            logger.debug("[HEALTH] Checking node availability...")
+            health_future = asyncio.gather(
+                *[self._check_node_health(url) for url in self.node_urls]
+            )
+
+            # Step 1: Encrypt and shard. Memory-map the file so the
+            # engine reads straight from the page cache - the only full
+            # in-memory buffer is the ciphertext it produces.
+            # (mmap cannot map empty files.)
+            try:
+                if file_size:
+                    with open(file_path, "rb") as f:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            view = memoryview(mm)
+                            try:
+                                shards, shard_metadata = await asyncio.to_thread(
+                                    self.storage_engine.encrypt_and_shard, view
+                                )
+                            finally:
+                                # Release the exported buffer so the mmap
+                                # can actually unmap when the block exits
+                                view.release()
+                else:
+                    shards, shard_metadata = self.storage_engine.encrypt_and_shard(b"")
+            except BaseException:
+                # Don't leave the probe tasks dangling if sharding fails
+                health_future.cancel()
+                raise
+
+            # Pull the exact ciphertext length and hash algorithm out of
+            # the shard metadata; they live at the manifest top level
+            ciphertext_length = shard_metadata.pop("_ct_len", None)
+            hash_algorithm = shard_metadata.pop("_hash_alg", None)
+
+            # Step 2: Collect the health results started above
+            health_checks = await health_future
+
+            # Verify we have enough nodes
+            if len(self.node_urls) < len(shards):
+                raise ValueError(
+                    f"Insufficient nodes: {len(self.node_urls)} available, "
+                    f"{len(shards)} required for {self.storage_engine.m_total}-way distribution"
+                )
+
+
+            healthy_nodes = [url for url, healthy in zip(self.node_urls, health_checks) if healthy]
+
+            # The fast pass can miss nodes that are merely slow (cold
+            # connection, loaded box) or still blacklisted; when that
+            # leaves too few for the upload, re-probe the missing ones
+            # with the relaxed deadline before failing the transaction
+            if len(healthy_nodes) < len(shards):
+                retry_nodes = [url for url in self.node_urls if url not in healthy_nodes]
+                logger.debug("[HEALTH] Only %d nodes passed the fast probe; re-probing %d",
+                             len(healthy_nodes), len(retry_nodes))
+                retry_checks = await asyncio.gather(
+                    *[self._check_node_health(url, timeout=_HEALTH_RETRY_TIMEOUT,
+                                              use_blacklist=False)
+                      for url in retry_nodes]
+                )
+                healthy_nodes.extend(
+                    url for url, healthy in zip(retry_nodes, retry_checks) if healthy
+                )
+
+            # Fastest nodes first: shard i goes to healthy_nodes[i], so
+            # ordering by smoothed RTT keeps the upload gather from being
+            # bounded by a slow node when a faster one is free
+            healthy_nodes.sort(key=lambda url: self._node_rtt.get(url, float('inf')))
+            logger.debug("[HEALTH] %d of %d nodes online", len(healthy_nodes), len(self.node_urls))
+            
+            if len(healthy_nodes) < len(shards):
+                raise ValueError(
+                    f"Insufficient healthy nodes: {len(healthy_nodes)} online, "
+                    f"{len(shards)} required"
+                )
+            
+            # Step 3: Distribute shards to nodes (track for rollback).
+            # TaskGroup + semaphore bounds in-flight uploads (no socket/FD
+            # flood with large m) and cancels siblings as soon as one
+            # shard fails, so the rollback starts immediately instead of
+            # waiting for every remaining upload to finish.
+            logger.debug("[DISTRIBUTE] Uploading %d shards (atomic transaction)...", len(shards))
+
+            shard_distribution = {}  # Maps shard_id -> node_url
+            upload_semaphore = asyncio.Semaphore(min(32, len(healthy_nodes)))
+
+            async def _bounded_upload(node_url: str, shard_identifier: str, shard_data: bytes):
+                async with upload_semaphore:
+                    ok = await self._upload_shard_to_node(node_url, shard_identifier, shard_data)
+                    if not ok:
+                        raise ValueError(f"Shard {shard_identifier} upload to {node_url} failed")
+
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    for shard_id, shard_data in enumerate(shards):
+                        node_url = healthy_nodes[shard_id]
+                        shard_identifier = f"{file_path.stem}_shard_{shard_id}"
+                        shard_distribution[shard_id] = {
+                            "node_url": node_url,
+                            "shard_identifier": shard_identifier
+                        }
+
+                        # Track for potential rollback
+                        uploaded_shards.append((node_url, shard_identifier))
+
+                        tg.create_task(
+                            _bounded_upload(node_url, shard_identifier, shard_data)
+                        )
+            except* ValueError as failures:
+                raise ValueError(
+                    f"[TRANSACTION FAILED] {len(failures.exceptions)} shard uploads failed. "
+                    f"Initiating rollback..."
+                ) from None
+            
+            logger.debug("[ATOMIC] All %d shards uploaded successfully", len(shards))
+            
+            # Step 4: Create metadata manifest (with sensitive key)
+            metadata_manifest = {
+                "filename": file_path.name,
+                "file_hash": file_hash,
+                "file_size": file_size,
+                "encryption_key": self.storage_engine.encryption_key.decode(),
+                "k_required": self.storage_engine.k_required,
+                "m_total": self.storage_engine.m_total,
+                "ct_len": ciphertext_length,
+                "hash_alg": hash_algorithm,
+                "aead": self.storage_engine.aead,
+                "shard_metadata": {
+                    str(shard_id): {
+                        # Raw digest in memory, base64 at the JSON
+                        # boundary (44 chars vs 64 for hex)
+                        "hash": base64.b64encode(shard_hash).decode(),
+                        "node_url": shard_distribution[shard_id]["node_url"],
+                        "shard_identifier": shard_distribution[shard_id]["shard_identifier"]
+                    }
+                    for shard_id, shard_hash in shard_metadata.items()
+                }
+            }
+            
+            # Step 5: Save ENCRYPTED metadata (envelope pattern); the
+            # serialise+encrypt+write runs off the event loop
+            metadata_path = self._metadata_path_for(file_path.name)
+            await asyncio.to_thread(self._save_encrypted_metadata, metadata_manifest, metadata_path)
+
+            # Keep the filename index current for O(1) downloads
+            self._metadata_index[file_path.name] = metadata_path
+
+            logger.info("[UPLOAD] %s complete: %d shards, manifest %s",
+                        file_path.name, len(shards), metadata_path)
+            
+            return str(metadata_path)
+            
+        except Exception as e:
+            # Rollback: Delete all uploaded shards
+            logger.error("[ROLLBACK] Upload of %s failed: %s; cleaning up %d uploaded shards",
+                         file_path.name, e, len(uploaded_shards))
+            
+            delete_tasks = [
+                self._delete_shard_from_node(node_url, shard_id)
+                for node_url, shard_id in uploaded_shards
+            ]
+            
+            delete_results = await asyncio.gather(*delete_tasks, return_exceptions=True)
+            successful_deletions = sum(1 for r in delete_results if r is True)
+            
+            logger.info("[ROLLBACK] Transaction aborted; cleaned up %d/%d shards",
+                        successful_deletions, len(uploaded_shards))
+            
+            # Re-raise original exception
+            raise
+    
+    def _save_encrypted_metadata(self, metadata: dict, path: Path):
+        """
+        Save metadata to disk with master key encryption (envelope pattern).
+        
+        This prevents plaintext exposure of file encryption keys.
+        
+        Args:
+            metadata: Metadata dictionary (contains sensitive encryption_key)
+            path: Path to save encrypted metadata file
+        """
+        # Serialize metadata to JSON. Compact output (no indentation) -
+        # the file is ciphertext anyway, and a smaller payload means less
+        # AEAD work on every save and load.
+        if orjson is not None:
+            metadata_bytes = orjson.dumps(metadata)
+        else:
+            metadata_bytes = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+
+        # Compress before encrypting when zstandard is installed: the
+        # repeated node URLs and identifier prefixes shrink ~3x, and the
+        # AEAD then has proportionally less to do. The version byte tells
+        # the loader whether the plaintext is compressed.
+        if zstd is not None:
+            metadata_bytes = self._zstd_compressor.compress(metadata_bytes)
+            version = _METADATA_VERSION_GCM_ZSTD
+        else:
+            version = _METADATA_VERSION_GCM
+
+        # Encrypt with the master key: version byte, then nonce || ct+tag.
+        # The AAD binds the ciphertext to this envelope format.
+        nonce = os.urandom(12)
+        ciphertext = self._metadata_aead.encrypt(nonce, metadata_bytes, _METADATA_AAD)
+
+        # Write encrypted bytes to disk
+        with open(path, 'wb') as f:
+            f.write(bytes([version]) + nonce + ciphertext)
+
+        # Drop any cached entries for the old version of this manifest
+        stale_keys = [key for key in self._meta_cache if key[0] == str(path)]
+        for key in stale_keys:
+            del self._meta_cache[key]
+        
+        logger.debug("[SECURITY] Metadata encrypted with master vault key")
+    
+    
+    def _load_encrypted_metadata(self, path: Path) -> dict:
+        """
+        Load and decrypt metadata from disk.
+        
+        Args:
+            path: Path to encrypted metadata file
+            
+        Returns:
+            Decrypted metadata dictionary
+            
+        Raises:
+            ValueError: If decryption fails (wrong key or corrupted file)
+        """
+        try:
+            # Cache hit: same path, mtime and size means same ciphertext
+            stat = os.stat(path)
+            cache_key = (str(path), stat.st_mtime_ns, stat.st_size)
+            cached = self._meta_cache.get(cache_key)
+            if cached is not None:
+                self._meta_cache.move_to_end(cache_key)
+                return cached
+
+            # Read encrypted bytes
+            with open(path, 'rb') as f:
+                encrypted_metadata = f.read()
+
+            # Decrypt with master key. Versioned envelopes are AES-GCM
+            # (version 3 additionally zstd-compressed); anything else is a
+            # legacy Fernet token (base64, so its first byte is printable
+            # ASCII, never 0x02/0x03)
+            version = encrypted_metadata[0] if encrypted_metadata else None
+            if version in (_METADATA_VERSION_GCM, _METADATA_VERSION_GCM_ZSTD):
+                nonce = encrypted_metadata[1:13]
+                ciphertext = encrypted_metadata[13:]
+                metadata_bytes = self._metadata_aead.decrypt(nonce, ciphertext, _METADATA_AAD)
+                if version == _METADATA_VERSION_GCM_ZSTD:
+                    if zstd is None:
+                        raise ValueError(
+                            "Manifest is zstd-compressed but the zstandard "
+                            "package is not installed (pip install zstandard)"
+                        )
+                    metadata_bytes = self._zstd_decompressor.decompress(metadata_bytes)
+            else:
+                metadata_bytes = self.metadata_cipher.decrypt(encrypted_metadata)
+
+            # Parse JSON (orjson accepts bytes directly)
+            if orjson is not None:
+                metadata = orjson.loads(metadata_bytes)
+            else:
+                metadata = json.loads(metadata_bytes)
+
+            self._meta_cache[cache_key] = metadata
+            if len(self._meta_cache) > self._meta_cache_max:
+                self._meta_cache.popitem(last=False)
+
+            logger.debug("[SECURITY] Metadata decrypted: %s", path)
+            return metadata
+            
+        except Exception as e:
+            raise ValueError(
+                f"Failed to decrypt metadata. Wrong MASTER_VAULT_KEY or corrupted file: {e}"
+            )
+    
+    
+    def _engine_for(self,
+                    encryption_key: bytes,
+                    aead: str,
+                    use_fernet: bool = False) -> DecentralizedStorageEngine:
+        """
+        Return a (cached) engine for a file's encryption key.
+
+        Engines are stateless per call, so sharing one per key is safe;
+        the LRU keeps only a handful alive so key material for long-
+        forgotten files does not linger in memory.
+        """
+        cache_key = (encryption_key, aead, use_fernet)
+        engine = self._engine_cache.get(cache_key)
+        if engine is not None:
+            self._engine_cache.move_to_end(cache_key)
+            return engine
+        engine = DecentralizedStorageEngine(
+            encryption_key=encryption_key, use_fernet=use_fernet, aead=aead
+        )
+        self._engine_cache[cache_key] = engine
+        if len(self._engine_cache) > self._engine_cache_max:
+            self._engine_cache.popitem(last=False)
+        return engine
+
+
+    def _reconstruct_to_disk(self,
+                             engine: DecentralizedStorageEngine,
+                             shards: List[bytes],
+                             shard_ids: List[int],
+                             shard_metadata: dict,
+                             output_path: Path) -> str:
+        """
+        Decrypt, hash and write the reconstructed file in one pass.
+
+        Runs synchronously (callers offload it with asyncio.to_thread):
+        each chunk the engine yields is fed to the hash and written
+        immediately, so the plaintext is never held twice.
+
+        Where the platform supports it (POSIX), chunks are written with
+        os.writev in batches - one syscall per batch, no Python-level
+        buffering of the memoryview slices. No fadvise: the gateway
+        serves the file via FileResponse right after this returns, so
+        the pages are wanted in cache.
+
+        Returns:
+            SHA-256 hex digest of the written bytes
+        """
+        hasher = hashlib.sha256()
+        chunk_iter = engine.recover_and_decrypt_iter(shards, shard_ids, shard_metadata)
+
+        if hasattr(os, "writev"):
+            fd = os.open(str(output_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                batch = []
+                for chunk in chunk_iter:
+                    hasher.update(chunk)
+                    batch.append(chunk)
+                    if len(batch) >= 64:
+                        _writev_all(fd, batch)
+                        batch.clear()
+                if batch:
+                    _writev_all(fd, batch)
+            finally:
+                os.close(fd)
+        else:
+            # Windows: no writev; buffered writes are the portable path
+            with open(output_path, "wb") as f:
+                for chunk in chunk_iter:
+                    hasher.update(chunk)
+                    f.write(chunk)
+        return hasher.hexdigest()
+
+
+    async def download_file(self,
+                           metadata_path: str,
+                           output_path: Optional[str] = None) -> str:
+        """
+        Download and reconstruct a file from distributed shards.
+        
+        Security: Metadata is decrypted using master key, then file is
+        reconstructed with mandatory integrity verification.
+        
+        Args:
+            metadata_path: Path to the encrypted .metadata.json file
+            output_path: Where to save the reconstructed file (defaults to original filename)
+            
+        Returns:
+            Path to the reconstructed file
+            
+        Raises:
+            ValueError: If insufficient shards can be retrieved
+            ValueError: If metadata decryption fails
+        """
+        metadata_path = Path(metadata_path)
+        
+        if not metadata_path.exists():
+            raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
+        
+        # Step 1: Load and decrypt metadata manifest (disk read + AEAD
+        # off the event loop; cache hits return without touching disk)
+        metadata = await asyncio.to_thread(self._load_encrypted_metadata, metadata_path)
+        
+        logger.info("[DOWNLOAD] Starting download of %s (%d bytes)",
+                    metadata['filename'], metadata['file_size'])
+        logger.debug("[RECOVERY] manifest=%s need %d of %d shards, hash=%s",
+                     metadata_path, metadata['k_required'], metadata['m_total'],
+                     metadata['file_hash'])
+        
+        # Storage engine for the original encryption key (from decrypted
+        # metadata); cached, so repeat downloads skip the key re-decode.
+        # Current manifests record the cipher mode in "aead" (including
+        # "fernet" for Fernet-mode engines); manifests written before the
+        # AEAD switch carry neither "aead" nor "ct_len" and their shard
+        # tokens are Fernet, so they get the legacy cipher too
+        is_legacy_fernet = 'aead' not in metadata and metadata.get('ct_len') is None
+        temp_engine = self._engine_for(
+            metadata['encryption_key'].encode(),
+            metadata.get('aead', 'aes-gcm'),
+            use_fernet=is_legacy_fernet
+        )
+        
+        # Step 2: Attempt to download shards
+        logger.debug("[DOWNLOAD] Fetching shards from nodes...")
+        
+        shard_info = metadata['shard_metadata']
+        download_tasks = []
+        shard_ids = []
+
+        # Bound in-flight downloads like the upload path; individual
+        # failures return None and are tolerated as long as k shards land
+        download_semaphore = asyncio.Semaphore(min(32, len(shard_info)))
+
+        async def _bounded_download(node_url: str, shard_identifier: str):
+            async with download_semaphore:
+                return await self._download_shard_from_node(node_url, shard_identifier)
+
+        for shard_id_str, info in shard_info.items():
+            shard_id = int(shard_id_str)
+            shard_ids.append(shard_id)
+            download_tasks.append(
+                _bounded_download(info['node_url'], info['shard_identifier'])
+            )
+
+        # Execute downloads concurrently
+        downloaded_shards = await asyncio.gather(*download_tasks)
+        
+        # Step 3: Filter successful downloads in one pass, keyed by shard
+        # id; the engine's argument lists are views over this dict
+
+        def _decode_hash(stored_hash: str) -> bytes:
+            # Current manifests store base64 (44 chars); manifests
+            # written before the switch hold 64-char hex digests
+            if len(stored_hash) == 64:
+                return bytes.fromhex(stored_hash)
+            return base64.b64decode(stored_hash)
+
+        present = {
+            shard_id: (shard_data, _decode_hash(shard_info[str(shard_id)]['hash']))
+            for shard_id, shard_data in zip(shard_ids, downloaded_shards)
+            if shard_data is not None
+        }
+        successful_ids = list(present.keys())
+        successful_shards = [data for data, _ in present.values()]
+        original_shard_metadata = {
+            shard_id: digest for shard_id, (_, digest) in present.items()
+        }
+        
+        # Hand the exact ciphertext length and hash algorithm back to the
+        # engine (both absent in legacy manifests)
+        if metadata.get('ct_len') is not None:
+            original_shard_metadata["_ct_len"] = metadata['ct_len']
+        if metadata.get('hash_alg') is not None:
+            original_shard_metadata["_hash_alg"] = metadata['hash_alg']
+
+        logger.debug("[RESULT] Successfully retrieved %d shards", len(successful_shards))
+        
+        # Step 4: Verify we have enough shards
+        if len(successful_shards) < metadata['k_required']:
+            raise ValueError(
+                f"Insufficient shards retrieved: {len(successful_shards)} available, "
+                f"{metadata['k_required']} required. Data cannot be recovered."
+            )
+        
+        # Step 5: Recover, decrypt and stream to disk. The engine yields
+        # the plaintext in chunks so it is hashed and written in one pass
+        # instead of being held twice (engine buffer + joined bytes).
+        logger.debug("[RECONSTRUCT] Reconstructing file from %d shards...", len(successful_shards))
+
+        if output_path is None:
+            output_path = Path("downloads") / metadata['filename']
+        else:
+            output_path = Path(output_path)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # The whole decrypt-hash-write pipeline is CPU and disk work, so
+        # it runs on a worker thread; the event loop stays free for other
+        # transfers (OpenSSL releases the GIL for the crypto)
+        try:
+            reconstructed_hash = await asyncio.to_thread(
+                self._reconstruct_to_disk,
+                temp_engine,
+                successful_shards,
+                successful_ids,
+                original_shard_metadata,
+                output_path,
+            )
+        except ValueError as e:
+            output_path.unlink(missing_ok=True)
+            raise ValueError(f"Reconstruction failed: {e}")
+
+        # Step 6: Verify file integrity (hash accumulated during the write)
+        if reconstructed_hash != metadata['file_hash']:
+            # Don't leave a file behind that failed verification
+            output_path.unlink(missing_ok=True)
+            raise ValueError(
+                f"File integrity check FAILED!\n"
+                f"Expected: {metadata['file_hash']}\n"
+                f"Got: {reconstructed_hash}"
+            )
+
+        logger.info("[DOWNLOAD] %s complete: hash verified, saved to %s",
+                    metadata['filename'], output_path)
+        
+        return str(output_path)
+
+
+async def demonstrate_orchestrator():
+    """
+    Example demonstration of the StorageOrchestrator.
+    """
+    print("="*70)
+    print("STORAGE ORCHESTRATOR DEMONSTRATION")
+    print("="*70)
+    
+    # Define storage nodes (should be running on these ports)
+    node_urls = [
+        "http://localhost:8001",
+        "http://localhost:8002",
+        "http://localhost:8003",
+        "http://localhost:8004",
+        "http://localhost:8005"
+    ]
+    
+    # Initialize orchestrator (uses its own engine)
+    from decentralized_storage_engine import DecentralizedStorageEngine
+    orchestrator = StorageOrchestrator(node_urls)
+    
+    # Create a test file
+    test_file = Path("test_upload.txt")
+    test_data = b"This is confidential data for the decentralized storage system demo!"
+    
+    with open(test_file, "wb") as f:
+        f.write(test_data)
+    
+    print(f"\n[TEST] Created test file: {test_file}")
+    
+    # Upload the file
+    try:
+        metadata_path = await orchestrator.upload_file(str(test_file))
+        print(f"[TEST] Upload completed. Metadata: {metadata_path}")
+        
+        # Download the file
+        downloaded_path = await orchestrator.download_file(metadata_path)
+        print(f"[TEST] Download completed: {downloaded_path}")
+        
+        # Verify content
+        with open(downloaded_path, "rb") as f:
+            downloaded_data = f.read()
+        
+        if downloaded_data == test_data:
+            print(f"\n[SUCCESS] ✓ File content verified - system working correctly!")
+        else:
+            print(f"\n[FAILURE] ✗ File content mismatch!")
+            
+    except Exception as e:
+        print(f"\n[ERROR] Demonstration failed: {e}")
+        print(f"[NOTE] Make sure storage nodes are running on ports 8001-8005")
+        print(f"[NOTE] Start nodes with: python node.py --port 8001 (and similar)")
+
+
+if __name__ == "__main__":
+    asyncio.run(demonstrate_orchestrator())